@@ -26,6 +26,7 @@ class DiscoveryListener(Listener):
             await device.bind()
             await device.request_version()
             _LOGGER.info(f"Device firmware: {device.hid}")
+            device.close()
 
 
 async def run_discovery(bind=False):
@@ -47,5 +48,12 @@ if __name__ == "__main__":
     parser.add_argument("--bind", default=False, action="store_true")
     args = parser.parse_args()
 
+    try:
+        import uvloop
+    except ImportError:
+        pass
+    else:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
     if args.discovery:
         asyncio.run(run_discovery(args.bind))
@@ -1,5 +0,0 @@
-import logging
-
-logging.basicConfig(
-    level=logging.DEBUG, format="%(name)s - %(levelname)s - %(message)s"
-)
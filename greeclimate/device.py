@@ -31,6 +31,16 @@ class Props(enum.Enum):
     UNKNOWN_HEATCOOLTYPE = "HeatCoolType"
 
 
+# Raw property keys used directly by `Device`, resolved once to avoid enum lookups
+_ALL_PROPS = tuple(p.value for p in Props)
+_TEMP_SET = Props.TEMP_SET.value
+_TEMP_SENSOR = Props.TEMP_SENSOR.value
+_TEMP_UNIT = Props.TEMP_UNIT.value
+_TEMP_BIT = Props.TEMP_BIT.value
+_SLEEP = Props.SLEEP.value
+_SLEEP_MODE = Props.SLEEP_MODE.value
+
+
 @unique
 class TemperatureUnits(IntEnum):
     C = 0
@@ -136,6 +146,30 @@ class DeviceInfo:
         return not self.__eq__(other)
 
 
+class _DeviceProperty:
+    """Descriptor exposing a single device property as a `Device` attribute.
+
+    The raw property key is resolved once when the class is built, so reads are a
+    single lookup against the cached device state and writes are cast to `int`
+    before being marked for the next state push.
+    """
+
+    __slots__ = ("key", "cast")
+
+    def __init__(self, prop: Props, cast=None):
+        self.key = prop.value
+        self.cast = cast
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = obj._properties.get(self.key) if obj._properties else None
+        return self.cast(value) if self.cast else value
+
+    def __set__(self, obj, value):
+        obj._set_property_value(self.key, int(value))
+
+
 class Device:
     """Class representing a physical device, it's state and properties.
 
@@ -146,6 +180,18 @@ class Device:
     Once a device is bound occasionally call `update_state` to request and update state from
     the HVAC, as it is possible that it changes state from other sources.
 
+    Property changes are held locally until `push_state_update` is called. Using the device as
+    an async context manager pushes all changes made within the block in a single request, or
+    discards them if the block raises. The context can't be nested or entered by two tasks at
+    once:
+
+        async with device:
+            device.power = True
+            device.mode = Mode.Cool
+
+    A connection to the unit is opened when first needed and kept for later requests, call
+    `close` to release it once the device is no longer used.
+
     Attributes:
         power: A boolean indicating if the unit is on or off
         mode: An int indicating operating mode, see `Mode` enum for possible values
@@ -166,17 +212,105 @@ class Device:
         power_save: A boolen to enable power save operation
     """
 
+    __slots__ = (
+        "__weakref__",
+        "_logger",
+        "_device_info",
+        "device_key",
+        "hid",
+        "_version",
+        "_version_major",
+        "_properties",
+        "_dirty",
+        "_stream",
+        "_lock",
+        "_snapshot",
+    )
+
     def __init__(self, device_info):
         self._logger = logging.getLogger(__name__)
 
-        self.device_info = device_info
+        self._stream = None
+        self._device_info = device_info
         self.device_key = None
 
         """ Device properties """
         self.hid = None
-        self.version = None
+        self._version = None
+        self._version_major = None
         self._properties = None
         self._dirty = []
+        self._lock = None
+        self._snapshot = None
+
+    async def __aenter__(self):
+        if self._snapshot is not None:
+            raise RuntimeError(
+                "Device changes are already being batched by another context"
+            )
+        # Values of the properties first changed within the context, for rolling back
+        self._snapshot = {}
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        """Push the changes made within the context, or discard them if it raised"""
+        snapshot, self._snapshot = self._snapshot, None
+        if exc_type is None:
+            await self.push_state_update()
+            return
+
+        # Only revert local changes, any state received from the device is kept
+        for key, value in snapshot.items():
+            if key not in self._dirty:
+                continue
+            self._dirty.remove(key)
+            if value is None:
+                self._properties.pop(key, None)
+            else:
+                self._properties[key] = value
+
+    @property
+    def device_info(self):
+        """Network details of the device"""
+        return self._device_info
+
+    @device_info.setter
+    def device_info(self, value):
+        # The open connection is still addressed to the old device
+        self.close()
+        self._device_info = value
+
+    async def _get_stream(self) -> network.DatagramStream:
+        """Return the connection to the device, opening it on first use"""
+        if self._stream is None:
+            self._stream = await network.create_datagram_stream(
+                (self.device_info.ip, self.device_info.port)
+            )
+        return self._stream
+
+    async def _request(self, request, *args, **kwargs):
+        """Run a network request over the device connection, one at a time.
+
+        The connection is dropped if the request fails or is cancelled, so a late reply can't
+        be read as the answer to the next request.
+        """
+        # Created here so the lock belongs to the running loop on Python < 3.10
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            stream = await self._get_stream()
+            try:
+                return await request(*args, stream=stream, **kwargs)
+            except BaseException:
+                self.close()
+                raise
+
+    def close(self) -> None:
+        """Close the connection to the device, it is reopened when next needed"""
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
 
     async def bind(self, key=None):
         """Run the binding procedure.
@@ -200,14 +334,14 @@ class Device:
         if not self.device_info:
             raise DeviceNotBoundError
 
-        self._logger.info("Starting device binding to %s", str(self.device_info))
+        self._logger.info("Starting device binding to %s", self.device_info)
 
         try:
             if key:
                 self.device_key = key
             else:
-                self.device_key = await network.bind_device(
-                    self.device_info, announce=False
+                self.device_key = await self._request(
+                    network.bind_device, self.device_info, announce=False
                 )
         except asyncio.TimeoutError:
             raise DeviceTimeoutError
@@ -219,7 +353,9 @@ class Device:
 
     async def request_version(self) -> None:
         """Request the firmware version from the device."""
-        ret = await network.request_state(["hid"], self.device_info, self.device_key)
+        ret = await self._request(
+            network.request_state, ["hid"], self.device_info, self.device_key
+        )
         self.hid = ret.get("hid")
 
         # Ex: hid = 362001000762+U-CS532AE(LT)V3.31.bin
@@ -240,13 +376,11 @@ class Device:
         if not self.device_key:
             await self.bind()
 
-        self._logger.debug("Updating device properties for (%s)", str(self.device_info))
-
-        props = [x.value for x in Props]
+        self._logger.debug("Updating device properties for (%s)", self.device_info)
 
         try:
-            self._properties = await network.request_state(
-                props, self.device_info, self.device_key
+            self._properties = await self._request(
+                network.request_state, _ALL_PROPS, self.device_info, self.device_key
             )
 
             # This check should prevent need to do version & device overrides
@@ -255,7 +389,7 @@ class Device:
             if not self.hid:
                 await self.request_version()
 
-            temp = self.get_property(Props.TEMP_SENSOR)
+            temp = self._get_property_value(_TEMP_SENSOR)
             if temp and temp <= TEMP_OFFSET:
                 self.version = "4.0"
 
@@ -270,62 +404,84 @@ class Device:
         if not self.device_key:
             await self.bind()
 
-        self._logger.debug("Pushing state updates to (%s)", str(self.device_info))
+        self._logger.debug("Pushing state updates to (%s)", self.device_info)
 
         props = {}
         for name in self._dirty:
             value = self._properties.get(name)
             self._logger.debug("Sending remote state update %s -> %s", name, value)
             props[name] = value
-            if name == Props.TEMP_SET.value:
-                props[Props.TEMP_BIT.value] = self._properties.get(Props.TEMP_BIT.value)
-                props[Props.TEMP_UNIT.value] = self._properties.get(
-                    Props.TEMP_UNIT.value
-                )
+            if name == _TEMP_SET:
+                props[_TEMP_BIT] = self._properties.get(_TEMP_BIT)
+                props[_TEMP_UNIT] = self._properties.get(_TEMP_UNIT)
 
         self._dirty.clear()
 
         try:
-            await network.send_state(props, self.device_info, key=self.device_key)
+            await self._request(
+                network.send_state, props, self.device_info, key=self.device_key
+            )
         except asyncio.TimeoutError:
             raise DeviceTimeoutError
 
+    @property
+    def version(self):
+        """Firmware version reported by the device, if known"""
+        return self._version
+
+    @version.setter
+    def version(self, value):
+        self._version = value
+        # Parsed once here rather than on every temperature read
+        self._version_major = value and int(value.split(".")[0])
+
     def get_property(self, name):
         """Generic lookup of properties tracked from the physical device"""
+        return self._get_property_value(name.value)
+
+    def _get_property_value(self, key):
+        """Lookup a property by its raw key"""
         if self._properties:
-            return self._properties.get(name.value)
+            return self._properties.get(key)
         return None
 
     def set_property(self, name, value):
         """Generic setting of properties for the physical device"""
-        if not self._properties:
-            self._properties = {}
-
-        if self._properties.get(name.value) == value:
-            return
-        else:
-            self._properties[name.value] = value
-            if name.value not in self._dirty:
-                self._dirty.append(name.value)
-
-    @property
-    def power(self) -> bool:
-        return bool(self.get_property(Props.POWER))
+        self._set_property_value(name.value, value)
 
-    @power.setter
-    def power(self, value: int):
-        self.set_property(Props.POWER, int(value))
+    def _set_property_value(self, key, value):
+        """Set a property by its raw key, marking it dirty if the value changed"""
+        props = self._properties
+        if props is None:
+            self._properties = props = {}
 
-    @property
-    def mode(self) -> int:
-        return self.get_property(Props.MODE)
+        old = props.get(key)
+        if old == value:
+            return
 
-    @mode.setter
-    def mode(self, value: int):
-        self.set_property(Props.MODE, int(value))
+        props[key] = value
+        if key not in self._dirty:
+            self._dirty.append(key)
+            if self._snapshot is not None:
+                self._snapshot[key] = old
+
+    power = _DeviceProperty(Props.POWER, bool)
+    mode = _DeviceProperty(Props.MODE)
+    temperature_units = _DeviceProperty(Props.TEMP_UNIT)
+    fan_speed = _DeviceProperty(Props.FAN_SPEED)
+    fresh_air = _DeviceProperty(Props.FRESH_AIR, bool)
+    xfan = _DeviceProperty(Props.XFAN, bool)
+    anion = _DeviceProperty(Props.ANION, bool)
+    light = _DeviceProperty(Props.LIGHT, bool)
+    horizontal_swing = _DeviceProperty(Props.SWING_HORIZ)
+    vertical_swing = _DeviceProperty(Props.SWING_VERT)
+    quiet = _DeviceProperty(Props.QUIET)
+    turbo = _DeviceProperty(Props.TURBO, bool)
+    steady_heat = _DeviceProperty(Props.STEADY_HEAT, bool)
+    power_save = _DeviceProperty(Props.POWER_SAVE, bool)
 
     def _convert_to_units(self, value, bit):
-        if self.temperature_units != TemperatureUnits.F.value:
+        if self.temperature_units != TemperatureUnits.F:
             return value
 
         if value < TEMP_MIN or value > TEMP_MAX:
@@ -336,8 +492,8 @@ class Device:
 
     @property
     def target_temperature(self) -> int:
-        temSet = self.get_property(Props.TEMP_SET)
-        temRec = self.get_property(Props.TEMP_BIT)
+        temSet = self._get_property_value(_TEMP_SET)
+        temRec = self._get_property_value(_TEMP_BIT)
         return self._convert_to_units(temSet, temRec)
 
     @target_temperature.setter
@@ -349,28 +505,19 @@ class Device:
         if self.temperature_units == 1:
             rec = generate_temperature_record(value)
             validate(rec["temSet"])
-            self.set_property(Props.TEMP_SET, rec["temSet"])
-            self.set_property(Props.TEMP_BIT, rec["temRec"])
+            self._set_property_value(_TEMP_SET, rec["temSet"])
+            self._set_property_value(_TEMP_BIT, rec["temRec"])
         else:
             validate(value)
-            self.set_property(Props.TEMP_SET, int(value))
-
-    @property
-    def temperature_units(self) -> int:
-        return self.get_property(Props.TEMP_UNIT)
-
-    @temperature_units.setter
-    def temperature_units(self, value: int):
-        self.set_property(Props.TEMP_UNIT, int(value))
+            self._set_property_value(_TEMP_SET, int(value))
 
     @property
     def current_temperature(self) -> int:
-        prop = self.get_property(Props.TEMP_SENSOR)
-        bit = self.get_property(Props.TEMP_BIT)
+        prop = self._get_property_value(_TEMP_SENSOR)
+        bit = self._get_property_value(_TEMP_BIT)
         if prop is not None:
-            v = self.version and int(self.version.split(".")[0])
             try:
-                if v == 4:
+                if self._version_major == 4:
                     return self._convert_to_units(prop, bit)
                 elif prop != 0:
                     return self._convert_to_units(prop - TEMP_OFFSET, bit)
@@ -379,99 +526,11 @@ class Device:
 
         return self.target_temperature
 
-    @property
-    def fan_speed(self) -> int:
-        return self.get_property(Props.FAN_SPEED)
-
-    @fan_speed.setter
-    def fan_speed(self, value: int):
-        self.set_property(Props.FAN_SPEED, int(value))
-
-    @property
-    def fresh_air(self) -> bool:
-        return bool(self.get_property(Props.FRESH_AIR))
-
-    @fresh_air.setter
-    def fresh_air(self, value: bool):
-        self.set_property(Props.FRESH_AIR, int(value))
-
-    @property
-    def xfan(self) -> bool:
-        return bool(self.get_property(Props.XFAN))
-
-    @xfan.setter
-    def xfan(self, value: bool):
-        self.set_property(Props.XFAN, int(value))
-
-    @property
-    def anion(self) -> bool:
-        return bool(self.get_property(Props.ANION))
-
-    @anion.setter
-    def anion(self, value: bool):
-        self.set_property(Props.ANION, int(value))
-
     @property
     def sleep(self) -> bool:
-        return bool(self.get_property(Props.SLEEP))
+        return bool(self._get_property_value(_SLEEP))
 
     @sleep.setter
     def sleep(self, value: bool):
-        self.set_property(Props.SLEEP, int(value))
-        self.set_property(Props.SLEEP_MODE, int(value))
-
-    @property
-    def light(self) -> bool:
-        return bool(self.get_property(Props.LIGHT))
-
-    @light.setter
-    def light(self, value: bool):
-        self.set_property(Props.LIGHT, int(value))
-
-    @property
-    def horizontal_swing(self) -> int:
-        return self.get_property(Props.SWING_HORIZ)
-
-    @horizontal_swing.setter
-    def horizontal_swing(self, value: int):
-        self.set_property(Props.SWING_HORIZ, int(value))
-
-    @property
-    def vertical_swing(self) -> int:
-        return self.get_property(Props.SWING_VERT)
-
-    @vertical_swing.setter
-    def vertical_swing(self, value: int):
-        self.set_property(Props.SWING_VERT, int(value))
-
-    @property
-    def quiet(self) -> bool:
-        return self.get_property(Props.QUIET)
-
-    @quiet.setter
-    def quiet(self, value: bool):
-        self.set_property(Props.QUIET, int(value))
-
-    @property
-    def turbo(self) -> bool:
-        return bool(self.get_property(Props.TURBO))
-
-    @turbo.setter
-    def turbo(self, value: bool):
-        self.set_property(Props.TURBO, int(value))
-
-    @property
-    def steady_heat(self) -> bool:
-        return bool(self.get_property(Props.STEADY_HEAT))
-
-    @steady_heat.setter
-    def steady_heat(self, value: bool):
-        self.set_property(Props.STEADY_HEAT, int(value))
-
-    @property
-    def power_save(self) -> bool:
-        return bool(self.get_property(Props.POWER_SAVE))
-
-    @power_save.setter
-    def power_save(self, value: bool):
-        self.set_property(Props.POWER_SAVE, int(value))
+        self._set_property_value(_SLEEP, int(value))
+        self._set_property_value(_SLEEP_MODE, int(value))
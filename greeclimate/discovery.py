@@ -206,20 +206,28 @@ class Discovery(BroadcastListenerProtocol, Listener):
         )
 
         if self._transport is None:
-            local_addr = (bcast_iface.ip_address, 0)
-
-            self._transport, _ = await self._loop.create_datagram_endpoint(
-                lambda: self, local_addr=local_addr, allow_broadcast=True
-            )
+            await self._create_transport(bcast_iface)
 
         await self.send({"t": "scan"}, (bcast_iface.bcast_address, 7000))
 
+    async def _create_transport(self, bcast_iface: IPInterface) -> None:
+        """Open the broadcast listener on the address of an interface."""
+        local_addr = (bcast_iface.ip_address, 0)
+
+        self._transport, _ = await self._loop.create_datagram_endpoint(
+            lambda: self, local_addr=local_addr, allow_broadcast=True
+        )
+
     async def search_devices(self, broadcastAddrs: str = None) -> None:
         """Search for devices with specific broadcast addresses."""
         if not broadcastAddrs:
             broadcastAddrs = self._get_broadcast_addresses()
 
         broadcastAddrs = list(broadcastAddrs)
-        await asyncio.gather(
-            *[asyncio.create_task(self.search_on_interface(b)) for b in broadcastAddrs]
-        )
+
+        # Open the shared listener up front, so concurrent searches don't each
+        # try to create it while the first one is still connecting
+        if broadcastAddrs and self._transport is None:
+            await self._create_transport(broadcastAddrs[0])
+
+        await asyncio.gather(*[self.search_on_interface(b) for b in broadcastAddrs])
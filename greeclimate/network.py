@@ -3,20 +3,47 @@ import base64
 import json
 import logging
 import socket
+from collections import deque
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Any, Dict, Text, Tuple, Union
 
 from Crypto.Cipher import AES
 
+try:
+    # orjson rejects ints wider than 64 bits and non-str keys, neither appear in packets
+    from orjson import dumps as _json_dumps, loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
+
+    def _json_dumps(obj) -> bytes:
+        # Match the compact, unescaped UTF-8 output of orjson so packets are identical
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+
 NETWORK_TIMEOUT = 10
 GENERIC_KEY = "a3K8Bx%2r8Y7#xDh"
 
 _LOGGER = logging.getLogger(__name__)
 
+# Envelope shared by all encrypted requests, only the target and payload vary
+_PACK_ENVELOPE = {"cid": "app", "i": 0, "t": "pack", "uid": 0}
+
+# Bind requests are only addressed by mac, so their envelope is kept pre-encoded
+_BIND_PREFIX = _json_dumps(dict(_PACK_ENVELOPE, i=1))[:-1] + b',"tcid":'
+_BIND_PACK = b',"pack":"'
+_BIND_SUFFIX = b'"}'
+
 
 IPAddr = Tuple[str, int]
 
 
+@lru_cache(maxsize=64)
+def _get_cipher(key: str):
+    """Return the AES cipher for a key, ECB ciphers are stateless so can be shared."""
+    return AES.new(key.encode(), AES.MODE_ECB)
+
+
 @dataclass
 class IPInterface:
     ip_address: str
@@ -26,16 +53,14 @@ class IPInterface:
 class DeviceProtocol2(asyncio.DatagramProtocol):
     """Event driven device protocol class."""
 
-    def __init__(self, timeout: int = 10, drained: asyncio.Event = None) -> None:
+    def __init__(self, timeout: int = 10) -> None:
         """Initialize the device protocol object.
 
         Args:
             timeout (int): Packet send timeout
-            drained (asyncio.Event): Packet send drain event signal
         """
         self._timeout = timeout
-        self._drained = drained or asyncio.Event()
-        self._drained.set()
+        self._drain_waiter = None
         self._transport = None
         self._key = GENERIC_KEY
 
@@ -77,6 +102,8 @@ class DeviceProtocol2(asyncio.DatagramProtocol):
         if exc is not None:
             _LOGGER.exception("Connection was closed unexpectedly", exc_info=exc)
 
+        self.resume_writing()
+
         if self._transport is not None:
             self._transport.close()
             self._transport = None
@@ -87,59 +114,65 @@ class DeviceProtocol2(asyncio.DatagramProtocol):
 
     def pause_writing(self) -> None:
         """Stop writing additional data to the transport."""
-        self._drained.clear()
+        if self._drain_waiter is None:
+            self._drain_waiter = asyncio.get_event_loop().create_future()
         super().pause_writing()
 
     def resume_writing(self) -> None:
         """Resume writing data to the transport."""
-        self._drained.set()
+        waiter, self._drain_waiter = self._drain_waiter, None
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
         super().resume_writing()
 
+    async def drain(self, timeout: int = None) -> None:
+        """Wait until the transport can accept more data, if writing is paused."""
+        if self._drain_waiter is not None:
+            await asyncio.wait_for(asyncio.shield(self._drain_waiter), timeout)
+
     def datagram_received(self, data: bytes, addr: IPAddr) -> None:
         """Handle an incoming datagram."""
         if len(data) == 0:
             return
 
-        obj = json.loads(data)
+        obj = _json_loads(data)
         key = GENERIC_KEY if obj.get("i") == 1 else self._key
 
         if obj.get("pack"):
             obj["pack"] = DeviceProtocol2.decrypt_payload(obj["pack"], key)
 
-        _LOGGER.debug("Received packet from %s:\n%s", addr[0], json.dumps(obj))
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug("Received packet from %s:\n%s", addr[0], json.dumps(obj))
 
         self.packet_received(obj, addr)
 
     async def send(self, obj, addr: IPAddr = None) -> None:
         """Send encode and send JSON command to the device."""
-        _LOGGER.debug("Sending packet:\n%s", json.dumps(obj))
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug("Sending packet:\n%s", json.dumps(obj))
 
         if obj.get("pack"):
             key = GENERIC_KEY if obj.get("i") == 1 else self._key
             obj["pack"] = DeviceProtocol2.encrypt_payload(obj["pack"], key)
 
-        data_bytes = json.dumps(obj).encode()
+        data_bytes = _json_dumps(obj)
         self._transport.sendto(data_bytes, addr)
-
-        task = asyncio.create_task(self._drained.wait())
-        await asyncio.wait_for(task, self._timeout)
+        await self.drain(self._timeout)
 
     @staticmethod
     def decrypt_payload(payload, key=GENERIC_KEY):
-        cipher = AES.new(key.encode(), AES.MODE_ECB)
+        cipher = _get_cipher(key)
         decoded = base64.b64decode(payload)
-        decrypted = cipher.decrypt(decoded).decode()
-        t = decrypted.replace(decrypted[decrypted.rindex("}") + 1 :], "")
-        return json.loads(t)
+        decrypted = cipher.decrypt(decoded)
+        # Trim at the end of the JSON object rather than trusting the padding
+        return _json_loads(decrypted[: decrypted.rindex(b"}") + 1])
 
     @staticmethod
     def encrypt_payload(payload, key=GENERIC_KEY):
-        def pad(s):
-            bs = 16
-            return s + (bs - len(s) % bs) * chr(bs - len(s) % bs)
-
-        cipher = AES.new(key.encode(), AES.MODE_ECB)
-        encrypted = cipher.encrypt(pad(json.dumps(payload)).encode())
+        data = _json_dumps(payload)
+        pad = 16 - (len(data) & 15)
+        cipher = _get_cipher(key)
+        encrypted = cipher.encrypt(data + bytes((pad,)) * pad)
         encoded = base64.b64encode(encrypted).decode()
         return encoded
 
@@ -156,16 +189,19 @@ class BroadcastListenerProtocol(DeviceProtocol2):
 
 
 class DeviceProtocol(asyncio.DatagramProtocol):
-    def __init__(
-        self, recvq: asyncio.Queue, excq: asyncio.Queue, drained: asyncio.Queue
-    ) -> None:
-        self._loop = asyncio.get_event_loop()
+    """Request/response protocol used by `DatagramStream`.
 
-        self._recvq = recvq
-        self._excq = excq
-        self._drained = drained
+    Incoming datagrams resolve the future of a pending `recv` directly, or are
+    held until the next one if nobody is waiting yet.
+    """
 
-        self._drained.set()
+    def __init__(self) -> None:
+        self._loop = asyncio.get_event_loop()
+
+        self._drain_waiter = None
+        self._packets = deque()
+        self._waiter = None
+        self._exc = None
 
         # Transports are connected at the time a connection is made.
         self._transport = None
@@ -175,35 +211,78 @@ class DeviceProtocol(asyncio.DatagramProtocol):
         self._transport = transport
 
     def datagram_received(self, data, addr: IPAddr) -> None:
-        self._recvq.put_nowait((data, addr))
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            self._waiter = None
+            waiter.set_result((data, addr))
+        else:
+            self._packets.append((data, addr))
 
     def connection_lost(self, exc) -> None:
         if exc is not None:
-            self._excq.put_nowait(exc)
+            self._set_exception(exc)
+
+        self.resume_writing()
 
         if self._transport is not None:
             self._transport.close()
             self._transport = None
 
     def error_received(self, exc) -> None:
-        self._excq.put_nowait(exc)
+        self._set_exception(exc)
 
     def pause_writing(self) -> None:
-        self._drained.clear()
+        if self._drain_waiter is None:
+            self._drain_waiter = self._loop.create_future()
         super().pause_writing()
 
     def resume_writing(self) -> None:
-        self._drained.set()
+        waiter, self._drain_waiter = self._drain_waiter, None
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
         super().resume_writing()
 
+    async def drain(self, timeout: int = None) -> None:
+        """Wait until the transport can accept more data, if writing is paused."""
+        if self._drain_waiter is not None:
+            await asyncio.wait_for(asyncio.shield(self._drain_waiter), timeout)
+
+    def _set_exception(self, exc) -> None:
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            self._waiter = None
+            waiter.set_exception(exc)
+        else:
+            self._exc = exc
+
+    def pop_exception(self):
+        """Return and clear the last error raised on the connection, if any."""
+        exc, self._exc = self._exc, None
+        return exc
+
+    def discard_datagrams(self) -> None:
+        """Drop datagrams received but not read, such as late replies."""
+        self._packets.clear()
+
+    def recv_ready(self) -> bool:
+        """Check if a received datagram is waiting to be read."""
+        return bool(self._packets)
+
+    def pop_datagram(self) -> Tuple[bytes, IPAddr]:
+        """Return the oldest datagram waiting to be read."""
+        return self._packets.popleft()
+
+    def wait_datagram(self) -> asyncio.Future:
+        """Return a future resolved with the next datagram received."""
+        self._waiter = self._loop.create_future()
+        return self._waiter
+
 
 # Concepts and code here were taken from https://github.com/jsbronder/asyncio-dgram
 class DatagramStream:
-    def __init__(self, transport, recvq, excq, drained, timeout: int = 120):
+    def __init__(self, transport, protocol, timeout: int = 120):
         self._transport = transport
-        self._recvq = recvq
-        self._excq = excq
-        self._drained = drained
+        self._protocol = protocol
         self._timeout = timeout
 
     def __del__(self):
@@ -211,11 +290,9 @@ class DatagramStream:
 
     @property
     def exception(self):
-        try:
-            exc = self._excq.get_nowait()
+        exc = self._protocol.pop_exception()
+        if exc is not None:
             raise exc
-        except asyncio.queues.QueueEmpty:
-            pass
 
     @property
     def socket(self):
@@ -229,31 +306,32 @@ class DatagramStream:
 
     async def send(self, data, addr=None) -> None:
         _ = self.exception
+        # Anything still unread can't be a reply to this request
+        self._protocol.discard_datagrams()
         self._transport.sendto(data, addr)
-
-        task = asyncio.create_task(self._drained.wait())
-        await asyncio.wait_for(task, self._timeout)
+        await self._protocol.drain(self._timeout)
 
     async def send_device_data(self, data, key=GENERIC_KEY) -> None:
         """Send a formatted request to the device."""
-        _LOGGER.debug("Sending packet:\n%s", json.dumps(data))
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug("Sending packet:\n%s", json.dumps(data))
 
         if "pack" in data:
             data["pack"] = DatagramStream.encrypt_payload(data["pack"], key)
 
-        data_bytes = json.dumps(data).encode()
+        data_bytes = _json_dumps(data)
         await self.send(data_bytes)
 
     def recv_ready(self):
         _ = self.exception
-        return not self._recvq.empty()
+        return self._protocol.recv_ready()
 
     async def recv(self):
         _ = self.exception
 
-        task = asyncio.create_task(self._recvq.get())
-        await asyncio.wait_for(task, self._timeout)
-        return task.result()
+        if self._protocol.recv_ready():
+            return self._protocol.pop_datagram()
+        return await asyncio.wait_for(self._protocol.wait_datagram(), self._timeout)
 
     async def recv_device_data(self, key=GENERIC_KEY):
         """Receive a formatted request from the device."""
@@ -261,64 +339,67 @@ class DatagramStream:
         if len(data_bytes) == 0:
             return
 
-        data = json.loads(data_bytes)
+        data = _json_loads(data_bytes)
 
         if "pack" in data:
             data["pack"] = DatagramStream.decrypt_payload(data["pack"], key)
 
-        _LOGGER.debug("Received packet:\n%s", json.dumps(data))
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug("Received packet:\n%s", json.dumps(data))
         return (data, addr)
 
     @staticmethod
     def decrypt_payload(payload, key=GENERIC_KEY):
-        cipher = AES.new(key.encode(), AES.MODE_ECB)
+        cipher = _get_cipher(key)
         decoded = base64.b64decode(payload)
-        decrypted = cipher.decrypt(decoded).decode()
-        t = decrypted.replace(decrypted[decrypted.rindex("}") + 1 :], "")
-        return json.loads(t)
+        decrypted = cipher.decrypt(decoded)
+        # Trim at the end of the JSON object rather than trusting the padding
+        return _json_loads(decrypted[: decrypted.rindex(b"}") + 1])
 
     @staticmethod
     def encrypt_payload(payload, key=GENERIC_KEY):
-        def pad(s):
-            bs = 16
-            return s + (bs - len(s) % bs) * chr(bs - len(s) % bs)
-
-        cipher = AES.new(key.encode(), AES.MODE_ECB)
-        encrypted = cipher.encrypt(pad(json.dumps(payload)).encode())
+        data = _json_dumps(payload)
+        pad = 16 - (len(data) & 15)
+        cipher = _get_cipher(key)
+        encrypted = cipher.encrypt(data + bytes((pad,)) * pad)
         encoded = base64.b64encode(encrypted).decode()
         return encoded
 
 
 async def create_datagram_stream(target: IPAddr) -> DatagramStream:
     loop = asyncio.get_event_loop()
-    recvq = asyncio.Queue()
-    excq = asyncio.Queue()
-    drained = asyncio.Event()
 
-    transport, _ = await loop.create_datagram_endpoint(
-        lambda: DeviceProtocol(recvq, excq, drained), remote_addr=target
+    transport, protocol = await loop.create_datagram_endpoint(
+        DeviceProtocol, remote_addr=target
+    )
+    return DatagramStream(transport, protocol, timeout=NETWORK_TIMEOUT)
+
+
+async def bind_device(device_info, announce=False, stream=None):
+    bind = {"mac": device_info.mac, "t": "bind", "uid": 0}
+    pack = DatagramStream.encrypt_payload(bind)
+    payload = b"".join(
+        (
+            _BIND_PREFIX,
+            _json_dumps(device_info.mac),
+            _BIND_PACK,
+            pack.encode(),
+            _BIND_SUFFIX,
+        )
     )
-    return DatagramStream(transport, recvq, excq, drained, timeout=NETWORK_TIMEOUT)
-
-
-async def bind_device(device_info, announce=False):
-    payload = {
-        "cid": "app",
-        "i": 1,
-        "t": "pack",
-        "uid": 0,
-        "tcid": device_info.mac,
-        "pack": {"mac": device_info.mac, "t": "bind", "uid": 0},
-    }
 
-    remote_addr = (device_info.ip, device_info.port)
-    stream = await create_datagram_stream(remote_addr)
+    close_stream = stream is None
+    if close_stream:
+        stream = await create_datagram_stream((device_info.ip, device_info.port))
     try:
         # Binding uses the generic key only
         if announce:
             await stream.send_device_data({"t": "scan"})
             await stream.recv_device_data()
-        await stream.send_device_data(payload)
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            packet = dict(_PACK_ENVELOPE, i=1, tcid=device_info.mac, pack=bind)
+            _LOGGER.debug("Sending packet:\n%s", json.dumps(packet))
+        await stream.send(payload)
         (r, _) = await stream.recv_device_data()
     except asyncio.TimeoutError as e:
         raise e
@@ -326,27 +407,26 @@ async def bind_device(device_info, announce=False):
         _LOGGER.exception("Encountered an error trying to bind device")
         raise e
     finally:
-        stream.close()
+        if close_stream:
+            stream.close()
 
     return r["pack"].get("key")
 
 
-async def send_state(property_values, device_info, key=GENERIC_KEY):
-    payload = {
-        "cid": "app",
-        "i": 0,
-        "t": "pack",
-        "uid": 0,
-        "tcid": device_info.mac,
-        "pack": {
+async def send_state(property_values, device_info, key=GENERIC_KEY, stream=None):
+    payload = dict(
+        _PACK_ENVELOPE,
+        tcid=device_info.mac,
+        pack={
             "opt": list(property_values.keys()),
             "p": list(property_values.values()),
             "t": "cmd",
         },
-    }
+    )
 
-    remote_addr = (device_info.ip, device_info.port)
-    stream = await create_datagram_stream(remote_addr)
+    close_stream = stream is None
+    if close_stream:
+        stream = await create_datagram_stream((device_info.ip, device_info.port))
     try:
         await stream.send_device_data(payload, key)
         (r, _) = await stream.recv_device_data(key)
@@ -356,7 +436,8 @@ async def send_state(property_values, device_info, key=GENERIC_KEY):
         _LOGGER.exception("Encountered an error sending state to device")
         raise e
     finally:
-        stream.close()
+        if close_stream:
+            stream.close()
 
     cols = r["pack"]["opt"]
 
@@ -365,18 +446,16 @@ async def send_state(property_values, device_info, key=GENERIC_KEY):
     return dict(zip(cols, dat))
 
 
-async def request_state(properties, device_info, key=GENERIC_KEY):
-    payload = {
-        "cid": "app",
-        "i": 0,
-        "t": "pack",
-        "uid": 0,
-        "tcid": device_info.mac,
-        "pack": {"mac": device_info.mac, "t": "status", "cols": list(properties)},
-    }
+async def request_state(properties, device_info, key=GENERIC_KEY, stream=None):
+    payload = dict(
+        _PACK_ENVELOPE,
+        tcid=device_info.mac,
+        pack={"mac": device_info.mac, "t": "status", "cols": list(properties)},
+    )
 
-    remote_addr = (device_info.ip, device_info.port)
-    stream = await create_datagram_stream(remote_addr)
+    close_stream = stream is None
+    if close_stream:
+        stream = await create_datagram_stream((device_info.ip, device_info.port))
     try:
         await stream.send_device_data(payload, key)
         (r, _) = await stream.recv_device_data(key)
@@ -386,7 +465,8 @@ async def request_state(properties, device_info, key=GENERIC_KEY):
         _LOGGER.exception("Encountered an error requesting update from device")
         raise e
     finally:
-        stream.close()
+        if close_stream:
+            stream.close()
 
     cols = r["pack"]["cols"]
     dat = r["pack"]["dat"]
@@ -10,6 +10,7 @@ setuptools.setup(
     name="greeclimate",
     python_requires=">=3.6",
     install_requires=requirements,
+    extras_require={"fast": ["orjson"]},
     author="Clifford Roche",
     author_email="",
     description="Discover, connect and control Gree based minisplit systems",
@@ -1,11 +1,11 @@
 import asyncio
-import socket
-from socket import SOCK_DGRAM
+from collections import deque
 from unittest.mock import Mock, create_autospec, patch
 
 from greeclimate.network import DeviceProtocol2
 
 DEFAULT_TIMEOUT = 5
+FLUSH_MARKER = b"flush"
 DISCOVERY_REQUEST = {"t": "scan"}
 DISCOVERY_RESPONSE = {
     "t": "pack",
@@ -80,24 +80,62 @@ def encrypt_payload(data):
     return d
 
 
-class Responder:
-    """Context manage for easy raw socket responders."""
+class UDPResponder(asyncio.DatagramProtocol):
+    """Responder for requests sent to the device port.
 
-    def __init__(self, family, addr) -> None:
-        """Initialize the class."""
-        self.sock = None
-        self.family = family
-        self.addr = addr
+    Each request received is answered by the next handler queued with `put`. Handlers are
+    called with the raw request and return or yield the raw responses to send back.
+    """
 
-    def __enter__(self):
-        """Enter the context manager."""
-        self.sock = socket.socket(self.family, SOCK_DGRAM)
-        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        self.sock.settimeout(DEFAULT_TIMEOUT)
-        self.sock.bind(("", self.addr))
-        return self.sock
+    def __init__(self) -> None:
+        """Initialize the responder."""
+        self.handlers = deque()
+        self.errors = []
+        self.transport = None
+        self._flushed = None
 
-    def __exit__(self, *args):
-        """Exit the context manager."""
-        self.sock.close()
+    def put(self, handler) -> None:
+        """Queue a handler for the next request."""
+        self.handlers.append(handler)
+
+    async def reset(self) -> None:
+        """Drop handlers, errors and requests left over from previous tests.
+
+        Requests sent to the port while the responder's loop wasn't running are still queued on
+        the socket. A marker is sent to the responder itself, once it is read everything queued
+        before it has been dropped.
+        """
+        self.handlers.clear()
+        self.errors.clear()
+
+        self._flushed = asyncio.get_running_loop().create_future()
+        port = self.transport.get_extra_info("sockname")[1]
+        self.transport.sendto(FLUSH_MARKER, ("127.0.0.1", port))
+        try:
+            await asyncio.wait_for(self._flushed, DEFAULT_TIMEOUT)
+        finally:
+            self._flushed = None
+
+    def raise_errors(self) -> None:
+        """Raise the first error seen by a handler."""
+        if self.errors:
+            raise self.errors[0]
+
+    def connection_made(self, transport: asyncio.DatagramTransport) -> None:
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        if self._flushed is not None:
+            if data == FLUSH_MARKER and not self._flushed.done():
+                self._flushed.set_result(None)
+            return
+
+        if not self.handlers:
+            return
+
+        handler = self.handlers.popleft()
+        try:
+            for response in handler(data):
+                self.transport.sendto(response, addr)
+        except Exception as exc:
+            self.errors.append(exc)
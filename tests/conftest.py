@@ -1,7 +1,11 @@
 """Pytest module configuration."""
+import asyncio
 from unittest.mock import patch
 
 import pytest
+import pytest_asyncio
+
+from .common import UDPResponder
 
 MOCK_INTERFACES = ["lo"]
 MOCK_LO_IFACE = {
@@ -16,3 +20,30 @@ def netifaces_fixture():
         "netifaces.ifaddresses", return_value=MOCK_LO_IFACE
     ) as ifaddr_mock:
         yield ifaddr_mock
+
+
+@pytest_asyncio.fixture(name="udp_endpoint", scope="session", loop_scope="session")
+async def udp_endpoint_fixture():
+    """Bind the device port once for the whole session.
+
+    Tests using the responder must run on the session event loop to be answered. Every async
+    test in modules using it is marked `pytest.mark.asyncio(loop_scope="session")`, as
+    pytest-asyncio 0.24 (the last release for Python 3.8) runs session loop tests on the wrong
+    loop once a function loop test has run in between.
+    """
+    loop = asyncio.get_running_loop()
+    transport, responder = await loop.create_datagram_endpoint(
+        UDPResponder, local_addr=("0.0.0.0", 7000), allow_broadcast=True
+    )
+    try:
+        yield responder
+    finally:
+        transport.close()
+
+
+@pytest_asyncio.fixture(name="udp_responder", loop_scope="session")
+async def udp_responder_fixture(udp_endpoint):
+    """Answer requests sent to the device port with handlers queued by the test."""
+    await udp_endpoint.reset()
+    yield udp_endpoint
+    udp_endpoint.raise_errors()
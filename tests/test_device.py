@@ -1,18 +1,32 @@
 import asyncio
 import enum
-from unittest.mock import patch
+import weakref
+from unittest.mock import AsyncMock, create_autospec, patch
 
 import pytest
 
 from greeclimate.device import Device, DeviceInfo, Props, TemperatureUnits
 from greeclimate.discovery import Discovery
 from greeclimate.exceptions import DeviceNotBoundError, DeviceTimeoutError
+from greeclimate.network import DatagramStream
 
 
 class FakeProps(enum.Enum):
     FAKE = "fake"
 
 
+@pytest.fixture(name="mock_stream", autouse=True)
+def mock_stream_fixture():
+    """Patch the device connection so no sockets are opened."""
+    stream = create_autospec(DatagramStream, instance=True)
+    with patch(
+        "greeclimate.network.create_datagram_stream",
+        new_callable=AsyncMock,
+        return_value=stream,
+    ):
+        yield stream
+
+
 def get_mock_info():
     return (
         "1.1.1.0",
@@ -138,7 +152,7 @@ def get_mock_state_0c_v3_temp():
 
 
 async def generate_device_mock_async():
-    d = Device(("192.168.1.29", 7000, "f4911e7aca59", "1e7aca59"))
+    d = Device(DeviceInfo("192.168.1.29", 7000, "f4911e7aca59", "1e7aca59"))
     await d.bind(key="St8Vw1Yz4Bc7Ef0H")
     return d
 
@@ -290,6 +304,96 @@ async def test_update_properties_timeout(mock_request):
         await device.update_state()
 
 
+@pytest.mark.asyncio
+@patch("greeclimate.network.request_state")
+@patch("greeclimate.network.send_state")
+async def test_device_reuses_stream(mock_push, mock_request, mock_stream):
+    """Check that one connection is used for all requests to the device."""
+    mock_request.return_value = get_mock_state()
+    device = await generate_device_mock_async()
+
+    await device.update_state()
+    device.power = False
+    await device.push_state_update()
+
+    assert mock_request.call_args.kwargs["stream"] is mock_stream
+    assert mock_push.call_args.kwargs["stream"] is mock_stream
+
+    device.close()
+    mock_stream.close.assert_called_once()
+
+
+@pytest.mark.asyncio
+@patch("greeclimate.network.request_state")
+async def test_device_info_change_reconnects(mock_request, mock_stream):
+    """Check that changing the device address drops the old connection."""
+    mock_request.return_value = get_mock_state()
+    device = await generate_device_mock_async()
+
+    await device.update_state()
+    device.device_info = DeviceInfo("1.1.1.1", 7000, "aabbcc001122", "MockDevice1")
+    mock_stream.close.assert_called_once()
+
+    with patch(
+        "greeclimate.network.create_datagram_stream",
+        new_callable=AsyncMock,
+        return_value=mock_stream,
+    ) as mock_create:
+        await device.update_state()
+
+    mock_create.assert_called_once_with(("1.1.1.1", 7000))
+
+
+@pytest.mark.asyncio
+@patch("greeclimate.network.request_state", side_effect=asyncio.TimeoutError)
+async def test_device_timeout_closes_stream(mock_request, mock_stream):
+    """Check that the connection is dropped when the device times out."""
+    device = await generate_device_mock_async()
+
+    with pytest.raises(DeviceTimeoutError):
+        await device.update_state()
+
+    mock_stream.close.assert_called_once()
+
+
+@pytest.mark.asyncio
+@patch("greeclimate.network.request_state")
+@patch("greeclimate.network.send_state")
+async def test_device_concurrent_requests(mock_push, mock_request):
+    """Check that requests sharing the connection run one at a time."""
+    active = []
+
+    async def request(*args, **kwargs):
+        assert not active
+        active.append(args)
+        await asyncio.sleep(0.01)
+        active.remove(args)
+        return get_mock_state()
+
+    mock_request.side_effect = request
+    mock_push.side_effect = request
+    device = await generate_device_mock_async()
+
+    device.power = False
+    await asyncio.gather(device.update_state(), device.push_state_update())
+
+    # Properties and firmware version
+    assert mock_request.call_count == 2
+    assert mock_push.call_count == 1
+
+
+@pytest.mark.asyncio
+@patch("greeclimate.network.request_state", side_effect=RuntimeError)
+async def test_device_error_closes_stream(mock_request, mock_stream):
+    """Check that the connection is dropped when a request fails."""
+    device = await generate_device_mock_async()
+
+    with pytest.raises(RuntimeError):
+        await device.request_version()
+
+    mock_stream.close.assert_called_once()
+
+
 @pytest.mark.asyncio
 @patch("greeclimate.network.send_state")
 async def test_set_properties_not_dirty(mock_request):
@@ -301,6 +405,28 @@ async def test_set_properties_not_dirty(mock_request):
     assert mock_request.call_count == 0
 
 
+@pytest.mark.asyncio
+@patch("greeclimate.network.request_state")
+@patch("greeclimate.network.send_state")
+async def test_set_properties_unchanged(mock_push, mock_request):
+    """Check that writing the current value of a property doesn't push it."""
+    mock_request.return_value = get_mock_state()
+    device = await generate_device_mock_async()
+    await device.update_state()
+
+    device.power = True
+    device.mode = 3
+    device.light = True
+    await device.push_state_update()
+    assert mock_push.call_count == 0
+
+    device.mode = 1
+    device.light = True
+    await device.push_state_update()
+    mock_push.assert_called_once()
+    assert mock_push.call_args.args[0] == {"Mod": 1}
+
+
 @pytest.mark.asyncio
 @patch("greeclimate.network.send_state")
 async def test_set_properties(mock_request):
@@ -341,6 +467,78 @@ async def test_set_properties(mock_request):
             assert device.get_property(p) == get_mock_state_on()[p.value]
 
 
+@pytest.mark.asyncio
+@patch("greeclimate.network.send_state")
+async def test_set_properties_context(mock_request):
+    """Check that changes made in a context are pushed in a single request."""
+    device = await generate_device_mock_async()
+
+    async with device:
+        device.power = True
+        device.mode = 1
+        device.fan_speed = 1
+        assert mock_request.call_count == 0
+
+    mock_request.assert_called_once()
+    assert mock_request.call_args.args[0] == {"Pow": 1, "Mod": 1, "WdSpd": 1}
+
+
+@pytest.mark.asyncio
+@patch("greeclimate.network.send_state")
+async def test_set_properties_context_error(mock_request):
+    """Check that changes are not pushed when the context exits with an error."""
+    device = await generate_device_mock_async()
+
+    with pytest.raises(RuntimeError):
+        async with device:
+            device.power = True
+            raise RuntimeError
+
+    assert not device.power
+    await device.push_state_update()
+    assert mock_request.call_count == 0
+
+
+@pytest.mark.asyncio
+@patch("greeclimate.network.send_state")
+async def test_set_properties_context_error_keeps_state(mock_push):
+    """Check that only changes made in a failed context are discarded."""
+    device = await generate_device_mock_async()
+    device.mode = 1
+
+    with patch("greeclimate.network.request_state", return_value=get_mock_state()):
+        with pytest.raises(RuntimeError):
+            async with device:
+                await device.update_state()
+                device.power = False
+                device.fan_speed = 3
+                raise RuntimeError
+
+    assert device.power is True
+    assert device.fan_speed == get_mock_state()["WdSpd"]
+    assert device.light is True
+
+    await device.push_state_update()
+    mock_push.assert_called_once()
+    assert mock_push.call_args.args[0] == {"Mod": get_mock_state()["Mod"]}
+
+
+@pytest.mark.asyncio
+@patch("greeclimate.network.send_state")
+async def test_set_properties_context_nested(mock_request):
+    """Check that a device context can't be entered again while it is open."""
+    device = await generate_device_mock_async()
+
+    async with device:
+        device.power = True
+        with pytest.raises(RuntimeError):
+            async with device:
+                pass
+
+    mock_request.assert_called_once()
+    assert mock_request.call_args.args[0] == {"Pow": 1}
+
+
 @pytest.mark.asyncio
 @patch("greeclimate.network.send_state", side_effect=asyncio.TimeoutError)
 async def test_set_properties_timeout(mock_request):
@@ -462,6 +660,28 @@ async def test_update_current_temp_v4(mock_request, temsen, hid):
     assert device.current_temperature == temsen
 
 
+@pytest.mark.asyncio
+@patch("greeclimate.network.request_state")
+async def test_update_current_temp_version_change(mock_request):
+    """Check that a firmware version change is used for later temperature reads."""
+    mock_request.return_value = {"TemSen": 61, "hid": "362001061060+U-W04HV3.29.bin"}
+    device = await generate_device_mock_async()
+
+    await device.update_state()
+    assert device.current_temperature == 21
+
+    device.version = "4.0"
+    assert device.current_temperature == 61
+
+
+def test_device_weakref():
+    """Check that devices can be weakly referenced without an instance dict."""
+    device = Device(DeviceInfo("1.1.1.1", 7000, "aabbcc112233", "MockDevice1"))
+
+    assert weakref.ref(device)() is device
+    assert not hasattr(device, "__dict__")
+
+
 @pytest.mark.asyncio
 @patch("greeclimate.network.request_state")
 async def test_update_current_temp_bad(mock_request):
@@ -2,31 +2,29 @@ import asyncio
 import json
 import socket
 from asyncio.tasks import wait_for
-from threading import Thread
 from unittest.mock import MagicMock, PropertyMock, create_autospec, patch
 
 import pytest
 
 from greeclimate.device import DeviceInfo
 from greeclimate.discovery import Discovery, Listener
-from greeclimate.network import DatagramStream, DeviceProtocol2
+from greeclimate.network import DatagramStream, DeviceProtocol2, IPInterface
 
 from .common import (
     DEFAULT_TIMEOUT,
     DISCOVERY_REQUEST,
     DISCOVERY_RESPONSE,
     DISCOVERY_RESPONSE_NO_CID,
-    Responder,
     encrypt_payload,
     get_mock_device_info,
 )
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 @pytest.mark.parametrize(
     "addr,bcast,family", [(("127.0.0.1", 7000), "127.255.255.255", socket.AF_INET)]
 )
-async def test_discover_devices(netifaces, addr, bcast, family):
+async def test_discover_devices(udp_responder, netifaces, addr, bcast, family):
     netifaces.return_value = {
         2: [{"addr": addr[0], "netmask": "255.0.0.0", "peer": bcast}]
     }
@@ -37,32 +35,25 @@ async def test_discover_devices(netifaces, addr, bcast, family):
         {"cid": "", "mac": "aabbcc001124", "name": "MockDevice3"},
     ]
 
-    with Responder(family, addr[1]) as sock:
+    def responder(d):
+        p = json.loads(d)
+        assert p == DISCOVERY_REQUEST
 
-        def responder(s):
-            (d, addr) = s.recvfrom(2048)
-            p = json.loads(d)
-            assert p == DISCOVERY_REQUEST
+        for d in devices:
+            r = DISCOVERY_RESPONSE.copy()
+            r["pack"].update(d)
+            p = json.dumps(encrypt_payload(r))
+            yield p.encode()
 
-            for d in devices:
-                r = DISCOVERY_RESPONSE.copy()
-                r["pack"].update(d)
-                p = json.dumps(encrypt_payload(r))
-                s.sendto(p.encode(), addr)
+    udp_responder.put(responder)
 
-        serv = Thread(target=responder, args=(sock,))
-        serv.start()
-
-        discovery = Discovery(allow_loopback=True)
-        devices = await discovery.scan(wait_for=DEFAULT_TIMEOUT)
-        assert devices is not None
-        assert len(devices) == 3
-
-        sock.close()
-        serv.join(timeout=DEFAULT_TIMEOUT)
+    discovery = Discovery(allow_loopback=True)
+    devices = await discovery.scan(wait_for=DEFAULT_TIMEOUT)
+    assert devices is not None
+    assert len(devices) == 3
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_discover_no_devices(netifaces):
     netifaces.return_value = {
         2: [{"addr": "127.0.0.1", "netmask": "255.0.0.0", "peer": "127.255.255.255"}]
@@ -75,12 +66,12 @@ async def test_discover_no_devices(netifaces):
     assert len(devices) == 0
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 @pytest.mark.parametrize(
     "addr,bcast,family", [(("127.0.0.1", 7000), "127.255.255.255", socket.AF_INET)]
 )
 async def test_discover_deduplicate_multiple_discoveries(
-    netifaces, addr, bcast, family
+    udp_responder, netifaces, addr, bcast, family
 ):
     netifaces.return_value = {
         2: [{"addr": addr[0], "netmask": "255.0.0.0", "peer": bcast}]
@@ -92,65 +83,51 @@ async def test_discover_deduplicate_multiple_discoveries(
         {"cid": "aabbcc001123", "mac": "aabbcc001123", "name": "MockDevice2"},
     ]
 
-    with Responder(family, addr[1]) as sock:
+    def responder(d):
+        p = json.loads(d)
+        assert p == DISCOVERY_REQUEST
 
-        def responder(s):
-            (d, addr) = s.recvfrom(2048)
-            p = json.loads(d)
-            assert p == DISCOVERY_REQUEST
+        for d in devices:
+            r = DISCOVERY_RESPONSE.copy()
+            r["pack"].update(d)
+            p = json.dumps(encrypt_payload(r))
+            yield p.encode()
 
-            for d in devices:
-                r = DISCOVERY_RESPONSE.copy()
-                r["pack"].update(d)
-                p = json.dumps(encrypt_payload(r))
-                s.sendto(p.encode(), addr)
+    udp_responder.put(responder)
 
-        serv = Thread(target=responder, args=(sock,))
-        serv.start()
-
-        discovery = Discovery(allow_loopback=True)
-        devices = await discovery.scan(wait_for=DEFAULT_TIMEOUT)
-        assert devices is not None
-        assert len(devices) == 2
-
-        sock.close()
-        serv.join(timeout=DEFAULT_TIMEOUT)
+    discovery = Discovery(allow_loopback=True)
+    devices = await discovery.scan(wait_for=DEFAULT_TIMEOUT)
+    assert devices is not None
+    assert len(devices) == 2
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 @pytest.mark.parametrize(
     "addr,bcast,family", [(("127.0.0.1", 7000), "127.255.255.255", socket.AF_INET)]
 )
-async def test_discovery_events(netifaces, addr, bcast, family):
+async def test_discovery_events(udp_responder, netifaces, addr, bcast, family):
     netifaces.return_value = {
         2: [{"addr": addr[0], "netmask": "255.0.0.0", "peer": bcast}]
     }
 
-    with Responder(family, addr[1]) as sock:
-
-        def responder(s):
-            (d, addr) = s.recvfrom(2048)
-            p = json.loads(d)
-            assert p == DISCOVERY_REQUEST
-
-            p = json.dumps(encrypt_payload(DISCOVERY_RESPONSE))
-            s.sendto(p.encode(), addr)
+    def responder(d):
+        p = json.loads(d)
+        assert p == DISCOVERY_REQUEST
 
-        serv = Thread(target=responder, args=(sock,))
-        serv.start()
+        p = json.dumps(encrypt_payload(DISCOVERY_RESPONSE))
+        yield p.encode()
 
-        with patch.object(Discovery, "packet_received", return_value=None) as mock:
-            discovery = Discovery(allow_loopback=True)
-            await discovery.scan()
-            await asyncio.sleep(DEFAULT_TIMEOUT)
+    udp_responder.put(responder)
 
-            assert mock.call_count == 1
+    with patch.object(Discovery, "packet_received", return_value=None) as mock:
+        discovery = Discovery(allow_loopback=True)
+        await discovery.scan()
+        await asyncio.sleep(DEFAULT_TIMEOUT)
 
-        sock.close()
-        serv.join(timeout=DEFAULT_TIMEOUT)
+        assert mock.call_count == 1
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_discovery_device_update_events():
     discovery = Discovery(allow_loopback=True)
     discovery.packet_received(
@@ -194,11 +171,11 @@ async def test_discovery_device_update_events():
     assert discovery.devices[0].ip == "1.1.2.2"
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 @pytest.mark.parametrize(
     "addr,bcast,family", [(("127.0.0.1", 7000), "127.255.255.255", socket.AF_INET)]
 )
-async def test_discover_devices_bad_data(netifaces, addr, bcast, family):
+async def test_discover_devices_bad_data(udp_responder, netifaces, addr, bcast, family):
     """Create a socket broadcast responder, an async broadcast listener,
     test discovery responses.
     """
@@ -206,30 +183,42 @@ async def test_discover_devices_bad_data(netifaces, addr, bcast, family):
         2: [{"addr": addr[0], "netmask": "255.0.0.0", "peer": bcast}]
     }
 
-    with Responder(family, addr[1]) as sock:
+    def responder(d):
+        p = json.loads(d)
+        assert p == DISCOVERY_REQUEST
+
+        yield "garbage data".encode()
 
-        def responder(s):
-            (d, addr) = s.recvfrom(2048)
-            p = json.loads(d)
-            assert p == DISCOVERY_REQUEST
+    udp_responder.put(responder)
 
-            s.sendto("garbage data".encode(), addr)
+    # Run the listener portion now
+    discovery = Discovery(allow_loopback=True)
+    response = await discovery.scan(wait_for=DEFAULT_TIMEOUT)
 
-        serv = Thread(target=responder, args=(sock,))
-        serv.start()
+    assert response is not None
+    assert len(response) == 0
 
-        # Run the listener portion now
-        discovery = Discovery(allow_loopback=True)
-        response = await discovery.scan(wait_for=DEFAULT_TIMEOUT)
 
-        assert response is not None
-        assert len(response) == 0
+@pytest.mark.asyncio(loop_scope="session")
+async def test_search_devices_multiple_interfaces():
+    """Check the listener is only opened once when searching several interfaces."""
+    discovery = Discovery()
+    interfaces = [
+        IPInterface("127.0.0.1", "127.255.255.255"),
+        IPInterface("127.0.0.1", "127.255.255.254"),
+    ]
+
+    loop = asyncio.get_event_loop()
+    with patch.object(
+        loop, "create_datagram_endpoint", wraps=loop.create_datagram_endpoint
+    ) as mock:
+        await discovery.search_devices(interfaces)
 
-        sock.close()
-        serv.join(timeout=DEFAULT_TIMEOUT)
+    assert mock.call_count == 1
+    discovery.close()
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_add_new_listener():
     """Register a listener, test that is registered."""
 
@@ -243,7 +232,7 @@ async def test_add_new_listener():
     assert result is None
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_add_new_listener_with_devices():
     """Register a listener, test that is registered."""
 
@@ -260,7 +249,7 @@ async def test_add_new_listener_with_devices():
         assert listener.device_found.call_count == 1
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_remove_listener():
     """Register, remove listener, test results."""
 
@@ -1,12 +1,16 @@
 import asyncio
+import base64
+import importlib.util
 import json
 import socket
-from threading import Thread
+import sys
 from unittest.mock import create_autospec, patch
 
 import pytest
+from Crypto.Cipher import AES
 
 from greeclimate.network import (
+    GENERIC_KEY,
     BroadcastListenerProtocol,
     DatagramStream,
     DeviceProtocol,
@@ -23,7 +27,6 @@ from .common import (
     DEFAULT_TIMEOUT,
     DISCOVERY_REQUEST,
     DISCOVERY_RESPONSE,
-    Responder,
     encrypt_payload,
     get_mock_device_info,
 )
@@ -40,7 +43,7 @@ class FakeDiscovery(BroadcastListenerProtocol):
         self.packets.append(obj)
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 @pytest.mark.parametrize(
     "addr,bcast,family", [(("127.0.0.1", 7000), "127.255.255.255", socket.AF_INET)]
 )
@@ -73,7 +76,7 @@ async def test_close_connection(addr, bcast, family):
         assert mock.call_count == 1
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_set_get_key():
     """Test the encryption key property."""
     key = "faketestkey"
@@ -82,7 +85,7 @@ async def test_set_get_key():
     assert dp2.device_key == key
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 @pytest.mark.parametrize("addr,bcast", [(("127.0.0.1", 7001), "127.255.255.255")])
 async def test_connection_error(addr, bcast):
     """Test the encryption key property."""
@@ -101,12 +104,11 @@ async def test_connection_error(addr, bcast):
     assert transport.is_closing()
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 @pytest.mark.parametrize("addr,bcast", [(("127.0.0.1", 7001), "127.255.255.255")])
 async def test_pause_resume(addr, bcast):
-    """Test the encryption key property."""
-    event = asyncio.Event()
-    dp2 = DeviceProtocol2(drained=event)
+    """Test sending waits while writing is paused."""
+    dp2 = DeviceProtocol2()
 
     loop = asyncio.get_event_loop()
     transport, _ = await loop.create_datagram_endpoint(
@@ -115,62 +117,59 @@ async def test_pause_resume(addr, bcast):
     )
 
     dp2.pause_writing()
-    assert not event.is_set()
+    task = asyncio.create_task(dp2.drain())
+    await asyncio.sleep(0)
+    assert not task.done()
 
     dp2.resume_writing()
-    assert event.is_set()
+    await asyncio.wait_for(task, DEFAULT_TIMEOUT)
 
     dp2.close()
     assert transport.is_closing()
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 @pytest.mark.parametrize(
     "addr,bcast,family", [(("127.0.0.1", 7000), "127.255.255.255", socket.AF_INET)]
 )
-async def test_broadcast_recv(addr, bcast, family):
+async def test_broadcast_recv(udp_responder, addr, bcast, family):
     """Create a socket broadcast responder, an async broadcast listener, test discovery responses."""
-    with Responder(family, addr[1]) as sock:
-
-        def responder(s):
-            (d, addr) = s.recvfrom(2048)
-            p = json.loads(d)
-            assert p == DISCOVERY_REQUEST
 
-            p = json.dumps(encrypt_payload(DISCOVERY_RESPONSE))
-            s.sendto(p.encode(), addr)
+    def responder(d):
+        p = json.loads(d)
+        assert p == DISCOVERY_REQUEST
 
-        serv = Thread(target=responder, args=(sock,))
-        serv.start()
+        p = json.dumps(encrypt_payload(DISCOVERY_RESPONSE))
+        yield p.encode()
 
-        # Run the listener portion now
-        loop = asyncio.get_event_loop()
+    udp_responder.put(responder)
 
-        bcast = (bcast, 7000)
-        local_addr = (addr[0], 0)
+    # Run the listener portion now
+    loop = asyncio.get_event_loop()
 
-        dp2 = FakeDiscovery()
-        await loop.create_datagram_endpoint(
-            lambda: dp2,
-            local_addr=local_addr,
-        )
+    bcast = (bcast, 7000)
+    local_addr = (addr[0], 0)
 
-        # Send the scan command
-        data = DISCOVERY_REQUEST
-        await dp2.send(data, bcast)
+    dp2 = FakeDiscovery()
+    await loop.create_datagram_endpoint(
+        lambda: dp2,
+        local_addr=local_addr,
+    )
 
-        # Wait on the scan response
-        await asyncio.sleep(DEFAULT_TIMEOUT)
-        response = dp2.packets
+    # Send the scan command
+    data = DISCOVERY_REQUEST
+    await dp2.send(data, bcast)
 
-        assert response
-        assert len(response) == 1
-        assert response[0] == DISCOVERY_RESPONSE
+    # Wait on the scan response
+    await asyncio.sleep(DEFAULT_TIMEOUT)
+    response = dp2.packets
 
-        serv.join(timeout=DEFAULT_TIMEOUT)
+    assert response
+    assert len(response) == 1
+    assert response[0] == DISCOVERY_RESPONSE
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 @pytest.mark.parametrize(
     "addr,bcast,family",
     [
@@ -204,88 +203,160 @@ async def test_broadcast_timeout(addr, bcast, family):
     assert len(response) == 0
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 @pytest.mark.parametrize("addr,family", [(("127.0.0.1", 7000), socket.AF_INET)])
-async def test_datagram_connect(addr, family):
+async def test_datagram_connect(udp_responder, addr, family):
     """Create a socket responder, an async connection, test send and recv."""
-    with Responder(family, addr[1]) as sock:
 
-        def responder(s):
-            (d, addr) = s.recvfrom(2048)
-            p = json.loads(d)
-            assert p == DISCOVERY_REQUEST
+    def responder(d):
+        p = json.loads(d)
+        assert p == DISCOVERY_REQUEST
 
-            p = json.dumps(DISCOVERY_RESPONSE)
-            s.sendto(p.encode(), addr)
+        p = json.dumps(DISCOVERY_RESPONSE)
+        yield p.encode()
 
-        serv = Thread(target=responder, args=(sock,))
-        serv.start()
+    udp_responder.put(responder)
 
-        # Run the listener portion now
-        loop = asyncio.get_event_loop()
-        recvq = asyncio.Queue()
-        excq = asyncio.Queue()
-        drained = asyncio.Event()
+    # Run the listener portion now
+    loop = asyncio.get_event_loop()
 
-        remote_addr = (addr[0], 7000)
+    remote_addr = (addr[0], 7000)
 
-        transport, _ = await loop.create_datagram_endpoint(
-            lambda: DeviceProtocol(recvq, excq, drained), remote_addr=remote_addr
-        )
-        stream = DatagramStream(transport, recvq, excq, drained)
-
-        # Send the scan command
-        data = json.dumps(DISCOVERY_REQUEST).encode()
-        await stream.send(data, None)
+    transport, protocol = await loop.create_datagram_endpoint(
+        DeviceProtocol, remote_addr=remote_addr
+    )
+    stream = DatagramStream(transport, protocol)
 
-        # Wait on the scan response
-        task = asyncio.create_task(stream.recv())
-        await asyncio.wait_for(task, timeout=DEFAULT_TIMEOUT)
-        (response, _) = task.result()
+    # Send the scan command
+    data = json.dumps(DISCOVERY_REQUEST).encode()
+    await stream.send(data, None)
 
-        assert response
-        assert len(response) > 0
-        assert json.loads(response) == DISCOVERY_RESPONSE
+    # Wait on the scan response
+    task = asyncio.create_task(stream.recv())
+    await asyncio.wait_for(task, timeout=DEFAULT_TIMEOUT)
+    (response, _) = task.result()
 
-        sock.close()
-        serv.join(timeout=DEFAULT_TIMEOUT)
+    assert response
+    assert len(response) > 0
+    assert json.loads(response) == DISCOVERY_RESPONSE
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 @pytest.mark.parametrize("addr,family", [(("127.0.0.1", 7000), socket.AF_INET)])
-async def test_create_stream(addr, family):
+async def test_create_stream(udp_responder, addr, family):
     """Create a socket responder, a network stream, test send and recv."""
-    with Responder(family, addr[1]) as sock:
 
-        def responder(s):
-            (d, addr) = s.recvfrom(2048)
-            p = json.loads(d)
-            assert p == DISCOVERY_REQUEST
+    def responder(d):
+        p = json.loads(d)
+        assert p == DISCOVERY_REQUEST
 
-            p = json.dumps(DISCOVERY_RESPONSE)
-            s.sendto(p.encode(), addr)
+        p = json.dumps(DISCOVERY_RESPONSE)
+        yield p.encode()
 
-        serv = Thread(target=responder, args=(sock,))
-        serv.start()
+    udp_responder.put(responder)
 
-        # Run the listener portion now
-        stream = await create_datagram_stream(addr)
+    # Run the listener portion now
+    stream = await create_datagram_stream(addr)
 
-        # Send the scan command
-        data = json.dumps(DISCOVERY_REQUEST).encode()
-        await stream.send(data)
+    # Send the scan command
+    data = json.dumps(DISCOVERY_REQUEST).encode()
+    await stream.send(data)
+
+    # Wait on the scan response
+    task = asyncio.create_task(stream.recv())
+    await asyncio.wait_for(task, timeout=DEFAULT_TIMEOUT)
+    (response, _) = task.result()
+
+    assert response
+    assert len(response) > 0
+    assert json.loads(response) == DISCOVERY_RESPONSE
 
-        # Wait on the scan response
-        task = asyncio.create_task(stream.recv())
-        await asyncio.wait_for(task, timeout=DEFAULT_TIMEOUT)
-        (response, _) = task.result()
 
-        assert response
-        assert len(response) > 0
-        assert json.loads(response) == DISCOVERY_RESPONSE
+@pytest.mark.asyncio(loop_scope="session")
+async def test_stream_recv_buffered():
+    """Test datagrams received before a recv call are returned in order."""
+    protocol = DeviceProtocol()
+    transport = create_autospec(asyncio.DatagramTransport, instance=True)
+    stream = DatagramStream(transport, protocol)
 
-        sock.close()
-        serv.join(timeout=DEFAULT_TIMEOUT)
+    protocol.datagram_received(b"first", ("127.0.0.1", 7000))
+    protocol.datagram_received(b"second", ("127.0.0.1", 7000))
+
+    assert stream.recv_ready()
+    assert await stream.recv() == (b"first", ("127.0.0.1", 7000))
+    assert await stream.recv() == (b"second", ("127.0.0.1", 7000))
+    assert not stream.recv_ready()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_stream_recv_waiting():
+    """Test a pending recv call is resolved by the next datagram."""
+    protocol = DeviceProtocol()
+    transport = create_autospec(asyncio.DatagramTransport, instance=True)
+    stream = DatagramStream(transport, protocol)
+
+    task = asyncio.create_task(stream.recv())
+    await asyncio.sleep(0)
+    protocol.datagram_received(b"data", ("127.0.0.1", 7000))
+
+    assert await asyncio.wait_for(task, DEFAULT_TIMEOUT) == (
+        b"data",
+        ("127.0.0.1", 7000),
+    )
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_stream_send_discards_unread():
+    """Test datagrams left unread are not returned as the reply to a new request."""
+    protocol = DeviceProtocol()
+    transport = create_autospec(asyncio.DatagramTransport, instance=True)
+    stream = DatagramStream(transport, protocol)
+
+    protocol.datagram_received(b"stale", ("127.0.0.1", 7000))
+    await stream.send(b"request")
+    assert not stream.recv_ready()
+
+    protocol.datagram_received(b"reply", ("127.0.0.1", 7000))
+    assert await stream.recv() == (b"reply", ("127.0.0.1", 7000))
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_stream_recv_error():
+    """Test connection errors are raised to a pending or following recv call."""
+    protocol = DeviceProtocol()
+    transport = create_autospec(asyncio.DatagramTransport, instance=True)
+    stream = DatagramStream(transport, protocol)
+
+    task = asyncio.create_task(stream.recv())
+    await asyncio.sleep(0)
+    protocol.error_received(OSError())
+
+    with pytest.raises(OSError):
+        await asyncio.wait_for(task, DEFAULT_TIMEOUT)
+
+    protocol.error_received(OSError())
+    with pytest.raises(OSError):
+        await stream.recv()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_stream_send_paused():
+    """Test stream sends wait for the transport to resume writing."""
+    protocol = DeviceProtocol()
+    transport = create_autospec(asyncio.DatagramTransport, instance=True)
+    stream = DatagramStream(transport, protocol)
+
+    await stream.send(b"data")
+    transport.sendto.assert_called_once_with(b"data", None)
+
+    protocol.pause_writing()
+    task = asyncio.create_task(stream.send(b"data"))
+    await asyncio.sleep(0)
+    assert not task.done()
+
+    protocol.resume_writing()
+    await asyncio.wait_for(task, DEFAULT_TIMEOUT)
+    assert transport.sendto.call_count == 2
 
 
 def test_encrypt_decrypt_payload():
@@ -298,151 +369,188 @@ def test_encrypt_decrypt_payload():
     assert decrypted == test_object
 
 
-@pytest.mark.asyncio
-@pytest.mark.parametrize("addr,family", [(("127.0.0.1", 7000), socket.AF_INET)])
-async def test_send_receive_device_data(addr, family):
-    """Create a socket responder, a network stream, test send and recv."""
-    with Responder(family, addr[1]) as sock:
+def test_encrypt_payload_padding():
+    """Test payloads are PKCS#7 padded to the AES block size."""
+    cipher = AES.new(GENERIC_KEY.encode(), AES.MODE_ECB)
 
-        def responder(s):
-            (d, addr) = s.recvfrom(2048)
-            p = json.loads(d)
-            assert p == DISCOVERY_REQUEST
+    for value in ["", "a" * 3, "a" * 4, "a" * 20, "\u00e9t\u00e9"]:
+        encrypted = DatagramStream.encrypt_payload({"k": value})
+        decrypted = cipher.decrypt(base64.b64decode(encrypted))
 
-            # Echoing because part of the request is encrypted
-            p = json.dumps(DISCOVERY_REQUEST)
-            s.sendto(p.encode(), addr)
+        pad = decrypted[-1]
+        assert 1 <= pad <= 16
+        assert decrypted[-pad:] == bytes((pad,)) * pad
+        assert json.loads(decrypted[:-pad]) == {"k": value}
+        assert DatagramStream.decrypt_payload(encrypted) == {"k": value}
 
-        serv = Thread(target=responder, args=(sock,))
-        serv.start()
 
-        # Run the listener portion now
-        stream = await create_datagram_stream(addr)
+def test_encrypt_decrypt_payload_keys():
+    """Test payloads encrypted with different keys don't share ciphers."""
+    test_object = {"fake-key": "fake-value"}
+    key = "St8Vw1Yz4Bc7Ef0H"
+
+    encrypted = DatagramStream.encrypt_payload(test_object, key)
+    assert encrypted != DatagramStream.encrypt_payload(test_object)
+
+    for _ in range(2):
+        assert DatagramStream.decrypt_payload(encrypted, key) == test_object
+        assert DatagramStream.encrypt_payload(test_object, key) == encrypted
+
+
+def test_encrypt_decrypt_payload_without_orjson():
+    """Test payloads are the same when falling back to the json module."""
+    spec = importlib.util.find_spec("greeclimate.network")
+    module = importlib.util.module_from_spec(spec)
+    with patch.dict(sys.modules, {"orjson": None}):
+        spec.loader.exec_module(module)
+
+    test_object = {
+        "t": "status",
+        "cols": ["Pow", "Mod"],
+        "mac": "aabbcc112233",
+        "name": "\u00e9t\u00e9",
+    }
+    assert module._json_loads is json.loads
+    assert module._json_dumps(test_object) == (
+        b'{"t":"status","cols":["Pow","Mod"],"mac":"aabbcc112233","name":"'
+        + "\u00e9t\u00e9".encode()
+        + b'"}'
+    )
 
-        # Send the scan command
-        await stream.send_device_data(DISCOVERY_REQUEST)
+    encrypted = module.DatagramStream.encrypt_payload(test_object)
+    assert encrypted == DatagramStream.encrypt_payload(test_object)
+    assert module.DatagramStream.decrypt_payload(encrypted) == test_object
 
-        # Wait on the scan response
-        task = asyncio.create_task(stream.recv_device_data())
-        await asyncio.wait_for(task, timeout=DEFAULT_TIMEOUT)
-        (response, _) = task.result()
 
-        assert response
-        assert response == DISCOVERY_REQUEST
+@pytest.mark.asyncio(loop_scope="session")
+@pytest.mark.parametrize("addr,family", [(("127.0.0.1", 7000), socket.AF_INET)])
+async def test_send_receive_device_data(udp_responder, addr, family):
+    """Create a socket responder, a network stream, test send and recv."""
 
-        serv.join(timeout=DEFAULT_TIMEOUT)
+    def responder(d):
+        p = json.loads(d)
+        assert p == DISCOVERY_REQUEST
 
+        # Echoing because part of the request is encrypted
+        p = json.dumps(DISCOVERY_REQUEST)
+        yield p.encode()
 
-@pytest.mark.asyncio
-@pytest.mark.parametrize("addr,family", [(("127.0.0.1", 7000), socket.AF_INET)])
-async def test_bind_device(addr, family):
-    with Responder(family, addr[1]) as sock:
+    udp_responder.put(responder)
 
-        def responder(s):
-            (d, addr) = s.recvfrom(2048)
-            p = json.loads(d)
+    # Run the listener portion now
+    stream = await create_datagram_stream(addr)
+
+    # Send the scan command
+    await stream.send_device_data(DISCOVERY_REQUEST)
+
+    # Wait on the scan response
+    task = asyncio.create_task(stream.recv_device_data())
+    await asyncio.wait_for(task, timeout=DEFAULT_TIMEOUT)
+    (response, _) = task.result()
 
-            r = DEFAULT_RESPONSE
-            r["pack"] = DeviceProtocol2.encrypt_payload(
-                {"t": "bindok", "key": "acbd1234"}
-            )
-            p = json.dumps(r)
-            s.sendto(p.encode(), addr)
+    assert response
+    assert response == DISCOVERY_REQUEST
 
-        serv = Thread(target=responder, args=(sock,))
-        serv.start()
 
-        # Run the listener portion now
-        response = await bind_device(get_mock_device_info())
+@pytest.mark.asyncio(loop_scope="session")
+@pytest.mark.parametrize("addr,family", [(("127.0.0.1", 7000), socket.AF_INET)])
+async def test_bind_device(udp_responder, addr, family):
+    def responder(d):
+        p = json.loads(d)
+        assert {k: v for k, v in p.items() if k != "pack"} == {
+            "cid": "app",
+            "i": 1,
+            "t": "pack",
+            "uid": 0,
+            "tcid": "aabbcc112233",
+        }
+        assert DeviceProtocol2.decrypt_payload(p["pack"]) == {
+            "mac": "aabbcc112233",
+            "t": "bind",
+            "uid": 0,
+        }
+
+        r = DEFAULT_RESPONSE
+        r["pack"] = DeviceProtocol2.encrypt_payload({"t": "bindok", "key": "acbd1234"})
+        p = json.dumps(r)
+        yield p.encode()
+
+    udp_responder.put(responder)
 
-        assert response
-        assert response == "acbd1234"
+    # Run the listener portion now
+    response = await bind_device(get_mock_device_info())
 
-        serv.join(timeout=DEFAULT_TIMEOUT)
+    assert response
+    assert response == "acbd1234"
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 @pytest.mark.parametrize("addr,family", [(("127.0.0.1", 7000), socket.AF_INET)])
-async def test_send_and_update_device_status_using_val(addr, family):
-    with Responder(family, addr[1]) as sock:
-
-        def responder(s):
-            (d, addr) = s.recvfrom(2048)
-            p = json.loads(d)
+async def test_send_and_update_device_status_using_val(udp_responder, addr, family):
 
-            r = DEFAULT_RESPONSE
-            r["pack"] = DeviceProtocol2.encrypt_payload(
-                {"opt": ["prop-a", "prop-b"], "val": ["val-a", "val-b"]}
-            )
-            p = json.dumps(r)
-            s.sendto(p.encode(), addr)
+    def responder(d):
+        p = json.loads(d)
 
-        serv = Thread(target=responder, args=(sock,))
-        serv.start()
+        r = DEFAULT_RESPONSE
+        r["pack"] = DeviceProtocol2.encrypt_payload(
+            {"opt": ["prop-a", "prop-b"], "val": ["val-a", "val-b"]}
+        )
+        p = json.dumps(r)
+        yield p.encode()
 
-        # Run the listener portion now
-        properties = {"prop-a": "val-a", "prop-b": "val-b"}
-        response = await send_state(properties, get_mock_device_info())
+    udp_responder.put(responder)
 
-        assert response
-        assert response == properties
+    # Run the listener portion now
+    properties = {"prop-a": "val-a", "prop-b": "val-b"}
+    response = await send_state(properties, get_mock_device_info())
 
-        serv.join(timeout=DEFAULT_TIMEOUT)
+    assert response
+    assert response == properties
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 @pytest.mark.parametrize("addr,family", [(("127.0.0.1", 7000), socket.AF_INET)])
-async def test_send_and_update_device_status_using_p(addr, family):
-    with Responder(family, addr[1]) as sock:
-
-        def responder(s):
-            (d, addr) = s.recvfrom(2048)
-            p = json.loads(d)
+async def test_send_and_update_device_status_using_p(udp_responder, addr, family):
 
-            r = DEFAULT_RESPONSE
-            r["pack"] = DeviceProtocol2.encrypt_payload(
-                {"opt": ["prop-a", "prop-b"], "p": ["val-a", "val-b"]}
-            )
-            p = json.dumps(r)
-            s.sendto(p.encode(), addr)
+    def responder(d):
+        p = json.loads(d)
 
-        serv = Thread(target=responder, args=(sock,))
-        serv.start()
+        r = DEFAULT_RESPONSE
+        r["pack"] = DeviceProtocol2.encrypt_payload(
+            {"opt": ["prop-a", "prop-b"], "p": ["val-a", "val-b"]}
+        )
+        p = json.dumps(r)
+        yield p.encode()
 
-        # Run the listener portion now
-        properties = {"prop-a": "val-a", "prop-b": "val-b"}
-        response = await send_state(properties, get_mock_device_info())
+    udp_responder.put(responder)
 
-        assert response
-        assert response == properties
+    # Run the listener portion now
+    properties = {"prop-a": "val-a", "prop-b": "val-b"}
+    response = await send_state(properties, get_mock_device_info())
 
-        serv.join(timeout=DEFAULT_TIMEOUT)
+    assert response
+    assert response == properties
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 @pytest.mark.parametrize("addr,family", [(("127.0.0.1", 7000), socket.AF_INET)])
-async def test_request_device_status(addr, family):
-    with Responder(family, addr[1]) as sock:
-
-        def responder(s):
-            (d, addr) = s.recvfrom(2048)
-            p = json.loads(d)
+async def test_request_device_status(udp_responder, addr, family):
 
-            r = DEFAULT_RESPONSE
-            r["pack"] = DeviceProtocol2.encrypt_payload(
-                {"cols": ["prop-a", "prop-b"], "dat": ["val-a", "val-b"]}
-            )
-            p = json.dumps(r)
-            s.sendto(p.encode(), addr)
+    def responder(d):
+        p = json.loads(d)
 
-        serv = Thread(target=responder, args=(sock,))
-        serv.start()
+        r = DEFAULT_RESPONSE
+        r["pack"] = DeviceProtocol2.encrypt_payload(
+            {"cols": ["prop-a", "prop-b"], "dat": ["val-a", "val-b"]}
+        )
+        p = json.dumps(r)
+        yield p.encode()
 
-        # Run the listener portion now
-        properties = {"prop-a": "val-a", "prop-b": "val-b"}
-        response = await request_state(properties, get_mock_device_info())
+    udp_responder.put(responder)
 
-        assert response
-        assert response == properties
+    # Run the listener portion now
+    properties = {"prop-a": "val-a", "prop-b": "val-b"}
+    response = await request_state(properties, get_mock_device_info())
 
-        serv.join(timeout=DEFAULT_TIMEOUT)
+    assert response
+    assert response == properties